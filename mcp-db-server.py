@@ -4,25 +4,36 @@ MCP сервер для безопасной работы с базами дан
 Поддерживает все предметы платформы с локальным хранением кредов
 """
 
+import copy
 import json
 import logging
 import os
 import re
 import hashlib
+import threading
 import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Optional, Any, Union, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Any, Union, Tuple
 import asyncio
 import yaml
 
 import psycopg2
 import psycopg2.extras
-from mcp.server import Server
-from mcp.types import (
-    Resource, Tool, TextContent, CallToolRequest,
-    ListResourcesRequest, ListToolsRequest, ReadResourceRequest
-)
-import mcp.server.stdio
+import psycopg2.pool
+
+# mcp импортируется лениво (см. _build_server): его загрузка заметно замедляет
+# старт CLI-режимов --help, --list-databases и --test
+if TYPE_CHECKING:
+    from mcp.server import Server
+    from mcp.types import TextContent, Tool
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него используем стандартный json
+    orjson = None
 
 # Настройка логирования
 logging.basicConfig(
@@ -35,10 +46,194 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Кэш распарсенных YAML-конфигов: path -> (mtime_ns, size, ino, parsed)
+_CONFIG_CACHE_MAXSIZE = 16
+_config_cache: "OrderedDict[str, Tuple[int, int, int, Any]]" = OrderedDict()
+_config_cache_lock = threading.Lock()
+
+
+def _read_config_cached(path: str) -> Any:
+    """Читает и парсит YAML-конфиг, переиспользуя результат, пока файл не изменился"""
+    abs_path = os.path.abspath(path)
+    st = os.stat(abs_path)
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    with _config_cache_lock:
+        cached = _config_cache.get(abs_path)
+        if cached is not None and cached[:3] == signature:
+            _config_cache.move_to_end(abs_path)
+            return copy.deepcopy(cached[3])
+
+    with open(abs_path, "r", encoding="utf-8") as f:
+        parsed = yaml.safe_load(f)
+
+    with _config_cache_lock:
+        _config_cache[abs_path] = (*signature, parsed)
+        _config_cache.move_to_end(abs_path)
+        while len(_config_cache) > _CONFIG_CACHE_MAXSIZE:
+            _config_cache.popitem(last=False)
+
+    return copy.deepcopy(parsed)
+
+
+# Ответы инструментов по умолчанию компактные: клиентам (LLM) отступы не нужны,
+# а размер ответа с indent=2 заметно больше. MCP_DB_PRETTY=1 включает форматирование
+_INDENT: Optional[int] = 2 if os.getenv("MCP_DB_PRETTY") == "1" else None
+
+if orjson is not None:
+    # datetime отдаем в default=str, чтобы формат совпадал со стандартным json
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if _INDENT:
+        _ORJSON_OPTIONS |= orjson.OPT_INDENT_2
+
+
+def _dumps(obj: Any) -> str:
+    """Сериализует результат инструмента в JSON (через orjson, если он установлен)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            # orjson.JSONEncodeError (наследник TypeError): например, целые больше 64 бит из numeric,
+            # для которых default не вызывается - сериализуем стандартным json
+            pass
+    if _INDENT:
+        return json.dumps(obj, ensure_ascii=False, indent=_INDENT, default=str)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+# Регулярки валидатора запросов компилируются один раз при импорте
+_DANGEROUS_WORDS = (
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
+    'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE'
+)
+_DANGEROUS = re.compile(r'\b(?:' + '|'.join(_DANGEROUS_WORDS) + r')\b', re.IGNORECASE)
+_ALLOWED_PREFIXES = ('SELECT', 'WITH', 'EXPLAIN', 'SHOW', 'DESCRIBE', 'VALUES')
+# Запросы, которые можно читать через серверный (именованный) курсор
+_STREAMABLE_PREFIXES = ('SELECT', 'WITH', 'VALUES')
+_SELECT_INTO = re.compile(r'\bINTO\b', re.IGNORECASE)
+# Длины начала запроса достаточно для проверки разрешенного ключевого слова
+_QUERY_HEAD_LENGTH = 16
+
+# Ограничения кэша схем таблиц: число записей и время жизни (секунды)
+_SCHEMA_CACHE_MAX = 256
+_SCHEMA_TTL = 300
+
+
+def _is_word_char(char: str) -> bool:
+    """Символ слова в смысле \\w регулярных выражений"""
+    return char.isalnum() or char == '_'
+
+
+def _contains_dangerous_word(query_upper: str) -> bool:
+    """Ищет модифицирующие операторы целым словом через str.find (быстрее регулярки)"""
+    length = len(query_upper)
+    for word in _DANGEROUS_WORDS:
+        pos = query_upper.find(word)
+        while pos != -1:
+            end = pos + len(word)
+            if ((pos == 0 or not _is_word_char(query_upper[pos - 1]))
+                    and (end == length or not _is_word_char(query_upper[end]))):
+                return True
+            pos = query_upper.find(word, pos + 1)
+    return False
+
+
+# Начала комментариев и литералов, которые нужно учитывать при удалении комментариев.
+# Идентификаторы берутся целиком: в PostgreSQL `$` допустим внутри имени (a$$b$),
+# и такой `$` или префикс E не должны открывать литерал
+_SQL_SPECIAL = re.compile(r"--|/\*|[^\W\d][\w$]*|['\"$]")
+_DOLLAR_TAG = re.compile(r'\$(?:[^\W\d]\w*)?\$')
+_BLOCK_COMMENT_EDGE = re.compile(r'/\*|\*/')
+
+
+def _skip_quoted(query: str, start: int, quote: str, backslash_escapes: bool) -> int:
+    """Возвращает позицию сразу за литералом, открытым кавычкой в start (конец строки, если он не закрыт)"""
+    pos = start + 1
+    while True:
+        end = query.find(quote, pos)
+        if end == -1:
+            return len(query)
+        if backslash_escapes:
+            # В E'...' кавычка, перед которой нечетное число обратных слешей, экранирована
+            slashes = 0
+            while query[end - 1 - slashes] == '\\':
+                slashes += 1
+            if slashes % 2:
+                pos = end + 1
+                continue
+        # Удвоенная кавычка - экранирование внутри того же литерала
+        if query.startswith(quote, end + 1):
+            pos = end + 2
+            continue
+        return end + 1
+
+
+def _skip_block_comment(query: str, start: int) -> int:
+    """Возвращает позицию сразу за комментарием /* */ с учетом вложенности (-1, если он не закрыт)"""
+    depth = 0
+    pos = start
+    while True:
+        edge = _BLOCK_COMMENT_EDGE.search(query, pos)
+        if edge is None:
+            return -1
+        depth += 1 if edge.group() == '/*' else -1
+        pos = edge.end()
+        if depth == 0:
+            return pos
+
+
+def _strip_sql_comments(query: str) -> str:
+    """Заменяет комментарии -- и /* */ пробелом за один линейный проход, не заходя внутрь литералов"""
+    parts = []
+    n = len(query)
+    copied = 0
+    pos = 0
+    while True:
+        match = _SQL_SPECIAL.search(query, pos)
+        if match is None:
+            break
+        token = match.group()
+        start = match.start()
+
+        if token == '--':
+            # PostgreSQL считает комментарий пробелом; перевод строки оставляем
+            parts.append(query[copied:start])
+            parts.append(' ')
+            end = query.find('\n', start)
+            copied = pos = n if end == -1 else end
+        elif token == '/*':
+            end = _skip_block_comment(query, start)
+            if end == -1:
+                # Незакрытый комментарий оставляем как есть - пусть попадет под проверки
+                break
+            parts.append(query[copied:start])
+            parts.append(' ')
+            copied = pos = end
+        elif token == '$':
+            # Идентификаторы разобраны целиком, поэтому `$` здесь начинает параметр или dollar-quote
+            tag = _DOLLAR_TAG.match(query, start)
+            if tag is None:
+                pos = start + 1
+            else:
+                end = query.find(tag.group(), tag.end())
+                pos = n if end == -1 else end + len(tag.group())
+        elif token in ("'", '"'):
+            pos = _skip_quoted(query, start, token, False)
+        elif token in ('e', 'E') and query.startswith("'", match.end()):
+            # E'...' - строка с экранированием обратным слешем
+            pos = _skip_quoted(query, match.end(), "'", True)
+        else:
+            pos = match.end()
+
+    parts.append(query[copied:])
+    return ''.join(parts)
+
+
 class DatabaseManager:
     """Менеджер для работы с базами данных предметов"""
 
     WRITE_ALLOWED_DATABASE_PATTERN = re.compile(r"_auto_\w\d+$")
+    LEGACY_RESERVED_KEYS = frozenset(["block_store", "template", "host", "port", "user", "password"])
 
     def __init__(self, config_path: str = None):
         # Получаем директорию скрипта
@@ -60,19 +255,42 @@ class DatabaseManager:
         else:
             self.config_path = os.path.join(script_dir, ".db.yaml")  # Fallback
         self.connections: Dict[str, Dict] = {}
-        self.schema_cache: Dict[str, Dict] = {}
+        # LRU-кэш схем таблиц: "database:table_name" -> {"schema": ..., "cached_at": ...}
+        self.schema_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._schema_cache_lock = threading.Lock()
+        self._schema_fetch_locks: Dict[str, threading.Lock] = {}
         # Таймаут подключения (секунды), можно переопределить через MCP_DB_CONNECT_TIMEOUT
         self.connect_timeout = int(os.getenv("MCP_DB_CONNECT_TIMEOUT", "2"))
         logger.info(f"Таймаут подключения к БД установлен: {self.connect_timeout} сек")
+        # Пулы подключений создаются лениво, по одному на БД
+        self.pool_max_connections = max(1, int(os.getenv("MCP_DB_POOL_MAX_CONNECTIONS", "8")))
+        self._pools: Dict[str, psycopg2.pool.ThreadedConnectionPool] = {}
+        # ThreadedConnectionPool не ждет свободное подключение, а падает - ограничиваем выдачу семафором
+        self._pool_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # Конструктор пула сразу подключается к БД, поэтому пулы разных БД создаются под своими блокировками
+        self._pool_create_locks: Dict[str, threading.Lock] = {}
+        self._pools_lock = threading.Lock()
+        # Подключение, простоявшее в пуле дольше этого времени, перед выдачей проверяется SELECT 1
+        self.pool_ping_after = float(os.getenv("MCP_DB_POOL_PING_AFTER_SECONDS", "30"))
+        self._conn_released_at: Dict[int, float] = {}
+        # Размер порции строк, забираемой серверным курсором за один round-trip
+        self.cursor_itersize = max(1, int(os.getenv("MCP_DB_CURSOR_ITERSIZE", "2000")))
+        # Ограничение числа строк в ответе execute_query по умолчанию (не задано - без ограничения)
+        max_rows_env = os.getenv("MCP_DB_MAX_ROWS")
+        self.default_max_rows: Optional[int] = max(0, int(max_rows_env)) if max_rows_env else None
+        # Кэш результата list_databases: (monotonic-время, данные)
+        self.list_databases_ttl = float(os.getenv("MCP_DB_LIST_TTL_SECONDS", "15"))
+        self._list_dbs_cache: Optional[Tuple[float, Dict[str, Dict]]] = None
+        self._list_dbs_cache_lock = threading.Lock()
         self._load_db_config()
 
 
 
     def _load_db_config(self):
         """Загружает конфигурацию подключений к БД"""
+        self._list_dbs_cache = None
         try:
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                db_config = yaml.safe_load(f)
+            db_config = _read_config_cached(self.config_path)
 
             templates = db_config.get("_templates", {}) if isinstance(db_config, dict) else {}
 
@@ -98,19 +316,14 @@ class DatabaseManager:
 
     def _parse_legacy_db_config_entry(self, db_info: Dict[str, Any]) -> Dict[str, Any]:
         """Парсит старый формат конфига вида host:port и user:password."""
-        host = None
-        port = None
-        user = None
-        password = None
-        reserved_keys = ["block_store", "template", "host", "port", "user", "password"]
-
-        for key, value in db_info.items():
-            if isinstance(value, int) and key not in reserved_keys:
-                host = key
-                port = value
-            elif isinstance(value, str) and key not in reserved_keys:
-                user = key
-                password = value
+        # Тип значения определяет пару: int -> (host, port), str -> (user, password)
+        legacy_pairs = {
+            type(value): (key, value)
+            for key, value in db_info.items()
+            if key not in self.LEGACY_RESERVED_KEYS and type(value) in (int, str)
+        }
+        host, port = legacy_pairs.get(int, (None, None))
+        user, password = legacy_pairs.get(str, (None, None))
 
         return {
             "host": host,
@@ -188,50 +401,193 @@ class DatabaseManager:
         if self._is_write_allowed_database(database):
             return True
 
-        query_clean = re.sub(r'--.*$', '', query, flags=re.MULTILINE)
-        query_clean = re.sub(r'/\*.*?\*/', '', query_clean, flags=re.DOTALL)
-        query_clean = query_clean.strip().upper()
+        # Быстрый путь для самого частого случая: SELECT без комментариев
+        if (query[:6].upper() == 'SELECT' and query[6:7].isspace()
+                and '--' not in query and '/*' not in query):
+            return not _contains_dangerous_word(query.upper())
 
-        # Разрешаем любые операции получения данных
-        allowed_keywords = [
-            'SELECT', 'WITH', 'EXPLAIN', 'SHOW', 'DESCRIBE', 'VALUES'
-        ]
-        if not any(query_clean.startswith(keyword) for keyword in allowed_keywords):
+        if '--' in query or '/*' in query:
+            query_clean = _strip_sql_comments(query)
+        else:
+            query_clean = query
+        query_clean = query_clean.lstrip()
+
+        # Разрешаем любые операции получения данных; в верхний регистр переводим только начало запроса
+        head = query_clean[:_QUERY_HEAD_LENGTH].upper()
+        if not head.startswith(_ALLOWED_PREFIXES):
             return False
 
         # Запрещаем любые модифицирующие операции только как отдельные слова (операторы)
-        dangerous_keywords = [
-            'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
-            'TRUNCATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE'
-        ]
-        for dangerous in dangerous_keywords:
-            # Ищем только целое слово (оператор), не подстроку
-            if re.search(rf'\\b{dangerous}\\b', query_clean):
-                return False
+        if _DANGEROUS.search(query_clean):
+            return False
         return True
 
-    def _get_connection(self, db_name: str):
-        """Получает подключение к БД"""
+    def _is_streamable_query(self, query: str) -> bool:
+        """Определяет, можно ли выполнить запрос через серверный курсор (DECLARE ... CURSOR FOR)"""
+        query_clean = _strip_sql_comments(query).strip().rstrip(';')
+        if not query_clean[:_QUERY_HEAD_LENGTH].upper().startswith(_STREAMABLE_PREFIXES):
+            return False
+        # DECLARE принимает только один читающий запрос
+        if ';' in query_clean:
+            return False
+        return not (_DANGEROUS.search(query_clean) or _SELECT_INTO.search(query_clean))
+
+    def _get_pool(self, db_name: str) -> psycopg2.pool.ThreadedConnectionPool:
+        """Возвращает пул подключений к БД, создавая его при первом обращении"""
         if db_name not in self.connections:
             raise ValueError(f"БД {db_name} не найдена в конфигурации")
 
-        conn_config = self.connections[db_name]
-
+        pool = self._pools.get(db_name)
+        if pool is not None:
+            return pool
+
+        with self._pools_lock:
+            create_lock = self._pool_create_locks.setdefault(db_name, threading.Lock())
+
+        with create_lock:
+            pool = self._pools.get(db_name)
+            if pool is None:
+                conn_config = self.connections[db_name]
+                pool = psycopg2.pool.ThreadedConnectionPool(
+                    1,
+                    self.pool_max_connections,
+                    host=conn_config["host"],
+                    port=conn_config["port"],
+                    database=conn_config["database"],
+                    user=conn_config["user"],
+                    password=conn_config["password"],
+                    connect_timeout=self.connect_timeout
+                )
+                with self._pools_lock:
+                    self._pool_slots[db_name] = threading.BoundedSemaphore(self.pool_max_connections)
+                    self._pools[db_name] = pool
+            return pool
+
+    def _is_connection_alive(self, conn) -> bool:
+        """Проверяет, что подключение из пула не было разорвано сервером"""
+        if conn.closed:
+            return False
         try:
-            conn = psycopg2.connect(
-                host=conn_config["host"],
-                port=conn_config["port"],
-                database=conn_config["database"],
-                user=conn_config["user"],
-                password=conn_config["password"],
-                connect_timeout=self.connect_timeout
-            )
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.autocommit = False
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _checkout(self, db_name: str, pool: psycopg2.pool.ThreadedConnectionPool):
+        """Берет подключение из пула, заменяя разорванное после простоя на новое"""
+        conn = pool.getconn()
+        released_at = self._conn_released_at.pop(id(conn), None)
+        if released_at is None or time.monotonic() - released_at < self.pool_ping_after:
+            return conn
+        if self._is_connection_alive(conn):
             return conn
+
+        logger.warning(f"Подключение к БД {db_name} из пула разорвано, переподключаемся")
+        pool.putconn(conn, close=True)
+        return pool.getconn()
+
+    @contextmanager
+    def _get_connection(self, db_name: str, autocommit: bool = False, reset_session: bool = False):
+        """Выдает подключение к БД из пула и возвращает его обратно после использования"""
+        # autocommit=True - для чтения метаданных: без транзакции и без COMMIT/ROLLBACK в конце.
+        # reset_session=True - для пользовательских запросов: перед возвратом в пул сессия сбрасывается
+        try:
+            pool = self._get_pool(db_name)
         except Exception as e:
             logger.error(f"Ошибка подключения к БД {db_name}: {e}")
             raise
 
+        slots = self._pool_slots[db_name]
+        slots.acquire()
+        try:
+            conn = self._checkout(db_name, pool)
+        except Exception as e:
+            slots.release()
+            logger.error(f"Ошибка подключения к БД {db_name}: {e}")
+            raise
 
+        broken = False
+        try:
+            if autocommit:
+                conn.autocommit = True
+            yield conn
+            if not autocommit:
+                conn.commit()
+        except Exception as e:
+            broken = bool(conn.closed) or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed and not autocommit:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
+        finally:
+            # В пул подключение возвращается в обычном транзакционном режиме
+            if autocommit and not conn.closed:
+                try:
+                    conn.autocommit = False
+                except psycopg2.Error:
+                    broken = True
+            # Пользовательский запрос мог изменить сессию (set_config, SET ROLE, advisory-блокировки,
+            # временные таблицы) - сбрасываем ее, чтобы состояние не досталось следующему вызову
+            if reset_session and not broken and not conn.closed:
+                try:
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute("DISCARD ALL")
+                    conn.autocommit = False
+                except psycopg2.Error:
+                    broken = True
+            self._conn_released_at[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=broken or bool(conn.closed))
+            # Сверх minconn пул закрывает возвращенные подключения - время простоя для них не храним
+            if conn.closed:
+                self._conn_released_at.pop(id(conn), None)
+            slots.release()
+
+    def close_all(self):
+        """Закрывает все пулы подключений"""
+        with self._pools_lock:
+            pools = list(self._pools.items())
+            self._pools.clear()
+            self._pool_slots.clear()
+            self._conn_released_at.clear()
+
+        for db_name, pool in pools:
+            try:
+                pool.closeall()
+            except Exception as e:
+                logger.warning(f"Ошибка закрытия пула подключений к БД {db_name}: {e}")
+
+    def warm_up(self, db_name: str, with_schemas: bool = False):
+        """Открывает подключение к БД заранее и при необходимости прогревает кэш схем"""
+        try:
+            with self._get_connection(db_name, autocommit=True) as conn:
+                with conn.cursor() as cur:
+                    if with_schemas:
+                        cur.execute(
+                            "SELECT count(*) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                            "WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm', 'f')"
+                        )
+                        tables_count = cur.fetchone()[0]
+                    else:
+                        cur.execute("SELECT 1")
+            # Схемы, не помещающиеся в LRU-кэш, только вытеснили бы друг друга - такие БД не прогреваем
+            if with_schemas and tables_count > _SCHEMA_CACHE_MAX:
+                logger.info(
+                    f"Кэш схем БД {db_name} не прогревается: таблиц ({tables_count}) больше размера кэша ({_SCHEMA_CACHE_MAX})"
+                )
+            elif with_schemas:
+                result = self.get_tables_schemas_direct(db_name)
+                if not result["success"]:
+                    logger.warning(f"Не удалось прогреть кэш схем БД {db_name}: {result['error']}")
+                    return
+            logger.info(f"Подключение к БД {db_name} прогрето")
+        except Exception as e:
+            logger.warning(f"Не удалось прогреть подключение к БД {db_name}: {e}")
 
     def _get_block_store_info(self, db_name: str) -> Dict[str, str]:
         """Получает информацию о блок-сторе для указанной БД"""
@@ -249,27 +605,25 @@ class DatabaseManager:
         """Собирает информацию по одной БД для list_databases (для вызова из пула потоков)."""
         config = self.connections[db_name]
         try:
-            with self._get_connection(db_name) as conn:
+            with self._get_connection(db_name, autocommit=True) as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                    # Один round-trip на БД: общая информация и число таблиц
                     cur.execute("""
                     SELECT
                         current_database() as database_name,
                         current_user as current_user,
                         version() as version,
-                        pg_database_size(current_database()) as size_bytes
+                        pg_database_size(current_database()) as size_bytes,
+                        (
+                            SELECT COUNT(*)
+                            FROM information_schema.tables
+                            WHERE table_schema = 'public'
+                        ) as tables_count
                     """)
-                    db_info = dict(cur.fetchone())
-
-                    cur.execute("""
-                    SELECT COUNT(*) as tables_count
-                    FROM information_schema.tables
-                    WHERE table_schema = 'public'
-                    """)
-                    tables_info = dict(cur.fetchone())
+                    db_info = cur.fetchone()
 
                     entry = {
                         **db_info,
-                        **tables_info,
                         "connection_config": {
                             "host": config["host"],
                             "database": config["database"],
@@ -294,7 +648,18 @@ class DatabaseManager:
             return (db_name, entry)
 
     def list_databases(self) -> Dict[str, Dict]:
-        """Возвращает список всех БД с информацией (параллельные подключения)."""
+        """Возвращает список всех БД с информацией, переиспользуя недавний результат опроса."""
+        with self._list_dbs_cache_lock:
+            cached = self._list_dbs_cache
+            if cached is not None and time.monotonic() - cached[0] < self.list_databases_ttl:
+                return copy.deepcopy(cached[1])
+
+            databases_info = self._probe_all()
+            self._list_dbs_cache = (time.monotonic(), databases_info)
+            return copy.deepcopy(databases_info)
+
+    def _probe_all(self) -> Dict[str, Dict]:
+        """Опрашивает все БД без кэша (параллельные подключения)."""
         db_names = list(self.connections.keys())
         if not db_names:
             return {}
@@ -318,11 +683,38 @@ class DatabaseManager:
         # Порядок ключей как в конфиге (а не порядок завершения запросов)
         return {name: databases_info[name] for name in db_names}
 
-    def execute_query_direct(self, query: str, database: str) -> Dict[str, Any]:
-        """Выполняет SQL запрос к БД напрямую"""
+    def _fetch_rows(self, cur, max_rows: Optional[int], chunk_size: int) -> Tuple[List[Dict], bool]:
+        """Читает строки порциями по chunk_size; возвращает строки и признак обрезки по max_rows"""
+        rows = []
+        # Читаем на одну строку больше лимита, чтобы понять, была ли выборка обрезана
+        while max_rows is None or len(rows) <= max_rows:
+            size = chunk_size if max_rows is None else min(chunk_size, max_rows + 1 - len(rows))
+            chunk = cur.fetchmany(size)
+            if not chunk:
+                break
+            rows.extend(chunk)
+
+        truncated = max_rows is not None and len(rows) > max_rows
+        if truncated:
+            del rows[max_rows:]
+        return rows, truncated
+
+    def execute_query_direct(
+        self,
+        query: str,
+        database: str,
+        max_rows: Optional[int] = None,
+        chunk_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Выполняет SQL запрос к БД напрямую (не более max_rows строк, если ограничение задано)"""
         if not self._validate_query(query, database):
             raise ValueError("Запрос содержит недопустимые операции")
 
+        if max_rows is not None and (
+            not isinstance(max_rows, int) or isinstance(max_rows, bool) or max_rows < 0
+        ):
+            raise ValueError(f"max_rows должен быть неотрицательным целым числом, получено: {max_rows!r}")
+
         if database not in self.connections:
             return {
                 "success": False,
@@ -331,30 +723,48 @@ class DatabaseManager:
                 "execution_time": 0
             }
 
+        if max_rows is None:
+            max_rows = self.default_max_rows
+        chunk_size = max(1, chunk_size or self.cursor_itersize)
+        truncated = False
         start_time = time.time()
 
         try:
-            with self._get_connection(database) as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    cur.execute(query)
+            with self._get_connection(database, reset_session=True) as conn:
+                if self._is_streamable_query(query):
+                    # Серверный курсор: строки забираются порциями по itersize,
+                    # а не буферизуются libpq целиком
+                    with conn.cursor(
+                        name=f"mcp_{uuid.uuid4().hex}",
+                        cursor_factory=psycopg2.extras.RealDictCursor
+                    ) as cur:
+                        cur.itersize = chunk_size
+                        cur.execute(query)
+                        results, truncated = self._fetch_rows(cur, max_rows, chunk_size)
+                else:
+                    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                        cur.execute(query)
 
-                    if cur.description:
-                        results = cur.fetchall()
-                        results = [dict(row) for row in results]
-                    else:
-                        results = []
+                        if cur.description:
+                            results, truncated = self._fetch_rows(cur, max_rows, chunk_size)
+                        else:
+                            results = []
 
-                    execution_time = time.time() - start_time
+            execution_time = time.time() - start_time
 
-                    logger.info(f"Запрос к БД {database} выполнен за {execution_time:.3f}с")
+            logger.info(f"Запрос к БД {database} выполнен за {execution_time:.3f}с")
 
-                    return {
-                        "success": True,
-                        "data": results,
-                        "rows_count": len(results),
-                        "execution_time": execution_time,
-                        "database": database
-                    }
+            result = {
+                "success": True,
+                "data": results,
+                "rows_count": len(results),
+                "execution_time": execution_time,
+                "database": database
+            }
+            if truncated:
+                result["truncated"] = True
+                result["limit"] = max_rows
+            return result
 
         except Exception as e:
             logger.error(f"Ошибка выполнения запроса к БД {database}: {e}")
@@ -378,28 +788,26 @@ class DatabaseManager:
         config = self.connections[database]
 
         try:
-            with self._get_connection(database) as conn:
+            with self._get_connection(database, autocommit=True) as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    # Основная информация
+                    # Основная информация и список таблиц одним запросом
                     cur.execute("""
                     SELECT
                         current_database() as database_name,
                         current_user as current_user,
                         version() as version,
-                        pg_database_size(current_database()) as size_bytes
-                    """)
-                    db_info = dict(cur.fetchone())
-
-                    # Список таблиц
-                    cur.execute("""
-                    SELECT
-                        tablename,
-                        pg_size_pretty(pg_total_relation_size('public.'||tablename)) as size
-                    FROM pg_tables
-                    WHERE schemaname = 'public'
-                    ORDER BY pg_total_relation_size('public.'||tablename) DESC
+                        pg_database_size(current_database()) as size_bytes,
+                        (
+                            SELECT json_agg(json_build_object(
+                                'tablename', tablename,
+                                'size', pg_size_pretty(pg_total_relation_size('public.'||tablename))
+                            ) ORDER BY pg_total_relation_size('public.'||tablename) DESC)
+                            FROM pg_tables
+                            WHERE schemaname = 'public'
+                        ) as tables
                     """)
-                    tables = [dict(row) for row in cur.fetchall()]
+                    db_info = cur.fetchone()
+                    tables = db_info.pop("tables") or []
 
                     return {
                         "success": True,
@@ -428,6 +836,97 @@ class DatabaseManager:
                 },
                 **self._get_block_store_info(database)
             }
+
+    def _schema_cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Возвращает копию схемы таблицы из кэша, если запись не устарела"""
+        with self._schema_cache_lock:
+            entry = self.schema_cache.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["cached_at"] >= _SCHEMA_TTL:
+                del self.schema_cache[key]
+                return None
+            self.schema_cache.move_to_end(key)
+            return copy.deepcopy(entry["schema"])
+
+    def _schema_cache_put(self, key: str, schema: Dict[str, Any]):
+        """Сохраняет схему таблицы в кэш, вытесняя самые старые записи"""
+        with self._schema_cache_lock:
+            self.schema_cache[key] = {"schema": copy.deepcopy(schema), "cached_at": time.time()}
+            self.schema_cache.move_to_end(key)
+            while len(self.schema_cache) > _SCHEMA_CACHE_MAX:
+                self.schema_cache.popitem(last=False)
+
+    def _schema_fetch_lock(self, database: str) -> threading.Lock:
+        """Блокировка загрузки схем одной БД, чтобы параллельные промахи не дублировали запросы"""
+        with self._schema_cache_lock:
+            return self._schema_fetch_locks.setdefault(database, threading.Lock())
+
+    def _take_cached_schema(self, database: str, table_name: str, tables: Dict[str, Dict]) -> bool:
+        """Кладет схему таблицы из кэша в tables; возвращает False при промахе"""
+        schema = self._schema_cache_get(f"{database}:{table_name}")
+        if schema is None:
+            return False
+        tables[table_name] = schema
+        return True
+
+    def _fetch_tables_schemas(self, database: str, table_names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Загружает из БД колонки и индексы указанных (или всех) таблиц"""
+        # Группировка по таблицам выполняется на стороне PostgreSQL:
+        # запрос возвращает одну строку с готовым объектом {table: {columns, indexes}}
+        columns_filter = ""
+        indexes_filter = ""
+        params = {}
+        if table_names:
+            columns_filter = " AND table_name::text = ANY(%(table_names)s)"
+            indexes_filter = " AND tablename::text = ANY(%(table_names)s)"
+            params["table_names"] = list(table_names)
+
+        schemas_query = f"""
+        WITH c AS (
+            SELECT
+                table_name::text AS table_name,
+                json_agg(json_build_object(
+                    'column_name', column_name,
+                    'data_type', data_type,
+                    'is_nullable', is_nullable,
+                    'column_default', column_default,
+                    'character_maximum_length', character_maximum_length,
+                    'numeric_precision', numeric_precision,
+                    'numeric_scale', numeric_scale
+                ) ORDER BY ordinal_position) AS cols
+            FROM information_schema.columns
+            WHERE table_schema = 'public'{columns_filter}
+            GROUP BY table_name
+        ), i AS (
+            SELECT
+                tablename::text AS tablename,
+                json_agg(json_build_object(
+                    'indexname', indexname,
+                    'indexdef', indexdef
+                )) AS idx
+            FROM pg_indexes
+            WHERE schemaname = 'public'{indexes_filter}
+            GROUP BY tablename
+        )
+        SELECT json_object_agg(
+            COALESCE(c.table_name, i.tablename),
+            json_build_object(
+                'columns', COALESCE(c.cols, '[]'::json),
+                'indexes', COALESCE(i.idx, '[]'::json)
+            )
+            ORDER BY COALESCE(c.table_name, i.tablename)
+        ) AS tables
+        FROM c FULL OUTER JOIN i ON c.table_name = i.tablename;
+        """
+
+        with self._get_connection(database, autocommit=True) as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(schemas_query, params)
+                row = cur.fetchone()
+
+        return row["tables"] or {}
+
     def get_tables_schemas_direct(self, database: str, table_names: Optional[List[str]] = None) -> Dict[str, Any]:
         """Получает схемы указанных таблиц или всех таблиц в БД"""
         if database not in self.connections:
@@ -438,90 +937,34 @@ class DatabaseManager:
             }
 
         try:
-            with self._get_connection(database) as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    # Формируем условие для фильтрации таблиц
-                    table_filter = ""
-                    params = []
-                    if table_names:
-                        placeholders = ','.join(['%s'] * len(table_names))
-                        table_filter = f" AND table_name IN ({placeholders})"
-                        params.extend(table_names)
-
-                    # Получаем колонки для указанных таблиц
-                    columns_query = f"""
-                    SELECT
-                        table_name,
-                        column_name,
-                        data_type,
-                        is_nullable,
-                        column_default,
-                        character_maximum_length,
-                        numeric_precision,
-                        numeric_scale
-                    FROM information_schema.columns
-                    WHERE table_schema = 'public'{table_filter}
-                    ORDER BY table_name, ordinal_position;
-                    """
-                    cur.execute(columns_query, params)
-                    columns_data = cur.fetchall()
-
-                    # Получаем индексы для указанных таблиц
-                    indexes_filter = ""
-                    if table_names:
-                        placeholders = ','.join(['%s'] * len(table_names))
-                        indexes_filter = f" AND tablename IN ({placeholders})"
-
-                    indexes_query = f"""
-                    SELECT
-                        tablename,
-                        indexname,
-                        indexdef
-                    FROM pg_indexes
-                    WHERE schemaname = 'public'{indexes_filter};
-                    """
-                    cur.execute(indexes_query, params if table_names else [])
-                    indexes_data = cur.fetchall()
-
-                    # Группируем данные по таблицам
-                    tables = {}
-                    for row in columns_data:
-                        table_name = row["table_name"]
-                        if table_name not in tables:
-                            tables[table_name] = {
-                                "columns": [],
-                                "indexes": []
-                            }
-                        tables[table_name]["columns"].append({
-                            "column_name": row["column_name"],
-                            "data_type": row["data_type"],
-                            "is_nullable": row["is_nullable"],
-                            "column_default": row["column_default"],
-                            "character_maximum_length": row.get("character_maximum_length"),
-                            "numeric_precision": row.get("numeric_precision"),
-                            "numeric_scale": row.get("numeric_scale")
-                        })
-
-                    # Добавляем индексы
-                    for row in indexes_data:
-                        table_name = row["tablename"]
-                        if table_name not in tables:
-                            tables[table_name] = {
-                                "columns": [],
-                                "indexes": []
-                            }
-                        tables[table_name]["indexes"].append({
-                            "indexname": row["indexname"],
-                            "indexdef": row["indexdef"]
-                        })
+            if table_names:
+                # Из БД запрашиваем только таблицы, которых нет в кэше
+                tables = {}
+                missing = [name for name in dict.fromkeys(table_names)
+                           if not self._take_cached_schema(database, name, tables)]
+                if missing:
+                    with self._schema_fetch_lock(database):
+                        # Пока ждали блокировку, схемы мог загрузить другой поток
+                        missing = [name for name in missing
+                                   if not self._take_cached_schema(database, name, tables)]
+                        if missing:
+                            fetched = self._fetch_tables_schemas(database, missing)
+                            for table_name, schema in fetched.items():
+                                self._schema_cache_put(f"{database}:{table_name}", schema)
+                            tables.update(fetched)
+                tables = {name: tables[name] for name in dict.fromkeys(table_names) if name in tables}
+            else:
+                tables = self._fetch_tables_schemas(database)
+                for table_name, schema in tables.items():
+                    self._schema_cache_put(f"{database}:{table_name}", schema)
 
-                    return {
-                        "success": True,
-                        "database": database,
-                        "tables": tables,
-                        "tables_count": len(tables),
-                        "requested_tables": table_names
-                    }
+            return {
+                "success": True,
+                "database": database,
+                "tables": tables,
+                "tables_count": len(tables),
+                "requested_tables": table_names
+            }
 
         except Exception as e:
             logger.error(f"Ошибка получения схем таблиц для БД {database}: {e}")
@@ -535,78 +978,93 @@ class DatabaseManager:
 # Создаем экземпляр менеджера БД
 db_manager = DatabaseManager()
 
-# Создаем MCP сервер
-server = Server("skyeng-db-server")
-
-@server.list_tools()
-async def list_tools() -> list[Tool]:
-    """Список доступных инструментов"""
-    return [
-        Tool(
-            name="execute_query",
-            description="Выполнить SQL запрос к БД. Для обычных БД разрешено только чтение, для тестовых *_auto_<env> разрешены любые запросы",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "SQL запрос. Для обычных БД только SELECT, WITH, EXPLAIN; для БД вида *_auto_y10/*_auto_s2 любые запросы"
+# Описание инструментов не меняется - собираем его один раз при первом запросе
+_TOOLS: Optional[List["Tool"]] = None
+
+
+def _get_tools() -> List["Tool"]:
+    """Возвращает описание инструментов MCP"""
+    global _TOOLS
+    if _TOOLS is None:
+        from mcp.types import Tool
+
+        _TOOLS = [
+            Tool(
+                name="execute_query",
+                description="Выполнить SQL запрос к БД. Для обычных БД разрешено только чтение, для тестовых *_auto_<env> разрешены любые запросы",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "SQL запрос. Для обычных БД только SELECT, WITH, EXPLAIN; для БД вида *_auto_y10/*_auto_s2 любые запросы"
+                        },
+                        "database": {
+                            "type": "string",
+                            "description": "Название БД (например: math, skysmart_english)"
+                        },
+                        "max_rows": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "Максимальное число строк в ответе (необязательно). Предпочтительнее ограничивать выборку через LIMIT в самом запросе"
+                        }
                     },
-                    "database": {
-                        "type": "string",
-                        "description": "Название БД (например: math, skysmart_english)"
-                    }
-                },
-                "required": ["query", "database"]
-            }
-        ),
-        Tool(
-            name="get_tables_schemas",
-            description="Получить схемы указанных таблиц или всех таблиц в БД",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "database": {
-                        "type": "string",
-                        "description": "Название БД"
+                    "required": ["query", "database"]
+                }
+            ),
+            Tool(
+                name="get_tables_schemas",
+                description="Получить схемы указанных таблиц или всех таблиц в БД. Несколько таблиц запрашивайте одним вызовом со списком table_names, а не отдельным вызовом на каждую таблицу",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "database": {
+                            "type": "string",
+                            "description": "Название БД"
+                        },
+                        "table_names": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Список названий таблиц - загружаются одним запросом к БД (необязательно, если не указан - возвращает все таблицы)"
+                        }
                     },
-                    "table_names": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Список названий таблиц (необязательно, если не указан - возвращает все таблицы)"
-                    }
-                },
-                "required": ["database"]
-            }
-        ),
-        Tool(
-            name="list_databases",
-            description="Получить список всех доступных БД",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        ),
-        Tool(
-            name="get_database_info",
-            description="Получить детальную информацию о БД",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "database": {
-                        "type": "string",
-                        "description": "Название БД"
-                    }
-                },
-                "required": ["database"]
-            }
-        ),
+                    "required": ["database"]
+                }
+            ),
+            Tool(
+                name="list_databases",
+                description="Получить список всех доступных БД",
+                inputSchema={
+                    "type": "object",
+                    "properties": {}
+                }
+            ),
+            Tool(
+                name="get_database_info",
+                description="Получить детальную информацию о БД",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "database": {
+                            "type": "string",
+                            "description": "Название БД"
+                        }
+                    },
+                    "required": ["database"]
+                }
+            ),
+        ]
+    return _TOOLS
 
-    ]
+async def list_tools() -> List["Tool"]:
+    """Список доступных инструментов"""
+    return _get_tools()
 
-@server.call_tool()
-async def call_tool(name: str, arguments: dict) -> list[TextContent]:
+async def call_tool(name: str, arguments: dict) -> List["TextContent"]:
     """Обработка вызовов инструментов"""
+    from mcp.types import TextContent
+
+    # psycopg2 синхронный: вся работа с БД выполняется в пуле потоков, чтобы не блокировать event loop
 
     try:
         if name == "execute_query":
@@ -619,10 +1077,12 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                     text="Ошибка: необходимо указать query и database"
                 )]
 
-            result = db_manager.execute_query_direct(query, database)
+            result = await asyncio.to_thread(
+                db_manager.execute_query_direct, query, database, arguments.get("max_rows")
+            )
             return [TextContent(
                 type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2, default=str)
+                text=_dumps(result)
             )]
 
         elif name == "get_tables_schemas":
@@ -635,17 +1095,17 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                     text="Ошибка: необходимо указать database"
                 )]
 
-            result = db_manager.get_tables_schemas_direct(database, table_names)
+            result = await asyncio.to_thread(db_manager.get_tables_schemas_direct, database, table_names)
             return [TextContent(
                 type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2, default=str)
+                text=_dumps(result)
             )]
 
         elif name == "list_databases":
-            result = db_manager.list_databases()
+            result = await asyncio.to_thread(db_manager.list_databases)
             return [TextContent(
                 type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2, default=str)
+                text=_dumps(result)
             )]
 
         elif name == "get_database_info":
@@ -657,10 +1117,10 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
                     text="Ошибка: необходимо указать database"
                 )]
 
-            result = db_manager.get_database_info_direct(database)
+            result = await asyncio.to_thread(db_manager.get_database_info_direct, database)
             return [TextContent(
                 type="text",
-                text=json.dumps(result, ensure_ascii=False, indent=2, default=str)
+                text=_dumps(result)
             )]
 
 
@@ -677,21 +1137,35 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             text=f"Ошибка: {str(e)}"
         )]
 
+_HELP_TEXT = """MCP сервер для работы с БД Skyeng Platform
+
+Использование:
+  mcp-skyeng-db                 - Запуск MCP сервера
+  mcp-skyeng-db --help           - Показать эту справку
+  mcp-skyeng-db --list-databases - Показать все БД и статус подключения
+  mcp-skyeng-db --test           - Проверить подключения ко всем БД
+
+Доступные инструменты MCP:
+  • execute_query         - Выполнить SQL запрос к БД; для *_auto_y10/*_auto_s2 и подобных тестовых БД разрешены любые запросы
+  • get_tables_schemas    - Получить схемы указанных таблиц (одним запросом для всего списка) или всех таблиц в БД
+  • list_databases        - Список всех доступных БД и их статус
+  • get_database_info     - Детальная информация о БД (размер, таблицы)
+
+Конфигурация:
+  ~/.config/mcp-skyeng-db/.db.yaml - Настройки подключений к БД"""
+
 def show_help():
     """Показать справку"""
-    print("MCP сервер для работы с БД Skyeng Platform\n")
-    print("Использование:")
-    print("  mcp-skyeng-db                 - Запуск MCP сервера")
-    print("  mcp-skyeng-db --help           - Показать эту справку")
-    print("  mcp-skyeng-db --list-databases - Показать все БД и статус подключения")
-    print("  mcp-skyeng-db --test           - Проверить подключения ко всем БД\n")
-    print("Доступные инструменты MCP:")
-    print("  • execute_query         - Выполнить SQL запрос к БД; для *_auto_y10/*_auto_s2 и подобных тестовых БД разрешены любые запросы")
-    print("  • get_tables_schemas    - Получить схемы указанных таблиц или всех таблиц в БД")
-    print("  • list_databases        - Список всех доступных БД и их статус")
-    print("  • get_database_info     - Детальная информация о БД (размер, таблицы)\n")
-    print("Конфигурация:")
-    print("  ~/.config/mcp-skyeng-db/.db.yaml - Настройки подключений к БД")
+    print(_HELP_TEXT)
+
+def _build_server() -> "Server":
+    """Создает MCP сервер и регистрирует обработчики инструментов"""
+    from mcp.server import Server
+
+    server = Server("skyeng-db-server")
+    server.list_tools()(list_tools)
+    server.call_tool()(call_tool)
+    return server
 
 async def main():
     """Запуск MCP сервера"""
@@ -724,7 +1198,7 @@ async def main():
         elif arg == '--test':
             try:
                 print("🔍 Тестирование подключений...")
-                databases = db_manager.list_databases()
+                databases = db_manager._probe_all()
                 working_count = 0
                 for db_name, info in databases.items():
                     status = "✅" if info.get("available", False) else "❌"
@@ -747,6 +1221,10 @@ async def main():
     # Запуск MCP сервера
     logger.info("Запуск MCP сервера для работы с БД Skyeng Platform")
 
+    # Пул потоков для блокирующих вызовов psycopg2 из call_tool (asyncio.to_thread)
+    max_workers = max(1, int(os.getenv("MCP_DB_MAX_WORKERS", "32")))
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_workers))
+
     # Проверяем доступные БД при запуске
     try:
         available_dbs = list(db_manager.connections.keys())
@@ -754,12 +1232,32 @@ async def main():
     except Exception as e:
         logger.error(f"Ошибка при проверке доступных БД: {e}")
 
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            server.create_initialization_options()
-        )
+    # Фоновый прогрев пулов подключений (и кэша схем), чтобы первый вызов не ждал подключения
+    warm_up_future = None
+    if os.getenv("MCP_DB_WARM") == "1":
+        with_schemas = os.getenv("MCP_DB_PREWARM_SCHEMAS") == "1"
+        warm_up_future = asyncio.gather(*[
+            asyncio.to_thread(db_manager.warm_up, db_name, with_schemas)
+            for db_name in db_manager.connections
+        ])
+
+    import mcp.server.stdio
+
+    server = _build_server()
+    try:
+        async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                server.create_initialization_options()
+            )
+    finally:
+        # Незавершенный прогрев не должен пережить сервер
+        if warm_up_future is not None:
+            warm_up_future.cancel()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        db_manager.close_all()
\ No newline at end of file
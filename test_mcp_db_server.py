@@ -1,7 +1,13 @@
+import asyncio
+import datetime
+import decimal
+import json
+import uuid
 import pytest
 import importlib.util
 import sys
 import textwrap
+import threading
 
 # Импортируем DatabaseManager из файла с дефисом в имени
 spec = importlib.util.spec_from_file_location("mcp_db_server", "./mcp-db-server.py")
@@ -52,6 +58,47 @@ def test_validate_query_blocks_write_for_regular_database(db_manager):
     assert db_manager._validate_query(query, "skysmart_english") is False
 
 
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT 1; DROP TABLE users",
+        "WITH d AS (DELETE FROM users RETURNING *) SELECT * FROM d",
+        "select 1;\ntruncate users",
+        "Select * From users; Delete From users",
+    ],
+)
+def test_validate_query_blocks_dangerous_keywords_after_allowed_prefix(db_manager, query):
+    assert db_manager._validate_query(query, "skysmart_english") is False
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        ("-- комментарий\nSELECT 1", True),
+        ("/* DROP */ SELECT 1", True),
+        ("SELECT 1 -- DELETE FROM users", True),
+        ("SELECT 1 /* -- */ ; DROP TABLE users", False),
+        ("/* SELECT */ DELETE FROM users", False),
+        ("SELECT 1; DROP/**/TABLE users", False),
+        ("SELECT 1;DELETE/* */FROM t", False),
+        ("SELECT '--'; DROP TABLE users", False),
+        ("SELECT '/*'; DROP TABLE users; SELECT '*/'", False),
+        ("SELECT E'\\' -- '; DROP TABLE users; --'", False),
+        ("SELECT $q$ -- $q$; DROP TABLE users", False),
+        ("SELECT 1 AS a$$$, $$ -- $$; DROP TABLE users", False),
+        ("SELECT 1 AS a$$b$, $b$ -- $b$; DROP TABLE users", False),
+        ("SELECT 1 /* /* */ -- */ ; DROP TABLE users", False),
+        ("SELECT 1 /* /* DROP */ */", True),
+        ("SELECT 1 AS a$$b$ -- DROP", True),
+        ("SELECT \"a--b\" FROM t -- DROP", True),
+        ("SELECT 'it''s -- ok' /* DROP */", True),
+        ("\n   explain analyze select 1", True),
+    ],
+)
+def test_validate_query_strips_comments(db_manager, query, expected):
+    assert db_manager._validate_query(query, "skysmart_english") is expected
+
+
 @pytest.mark.parametrize(
     ("database_name", "query"),
     [
@@ -64,6 +111,41 @@ def test_validate_query_allows_any_query_for_auto_databases(db_manager, database
     assert db_manager._validate_query(query, database_name) is True
 
 
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT created_at, updated_by FROM users",
+        "SELECT 1; drop table users",
+        "SELECT execute_at FROM jobs",
+        "SELECT 1 FROM t WHERE a = 'x'; EXECUTE plan",
+        "SELECT exec(1)",
+        "SELECT 1 FROM t_delete",
+        "SELECT 1;GRANT ALL ON t TO u",
+    ],
+)
+def test_fast_path_dangerous_scan_matches_regex(query):
+    assert mcp_db_server._contains_dangerous_word(query.upper()) is bool(mcp_db_server._DANGEROUS.search(query))
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        ("SELECT * FROM users;", True),
+        ("-- список\nwith u AS (SELECT 1) SELECT * FROM u", True),
+        ("VALUES (1), (2)", True),
+        ("EXPLAIN SELECT 1", False),
+        ("SHOW search_path", False),
+        ("SELECT 1; SELECT 2", False),
+        ("SELECT '--'; DROP TABLE users", False),
+        ("SELECT '/*'; DROP TABLE users; SELECT '*/'", False),
+        ("SELECT * INTO users_copy FROM users", False),
+        ("WITH d AS (DELETE FROM users RETURNING *) SELECT * FROM d", False),
+    ],
+)
+def test_is_streamable_query(db_manager, query, expected):
+    assert db_manager._is_streamable_query(query) is expected
+
+
 @pytest.mark.parametrize(
     ("database_name", "expected"),
     [
@@ -153,4 +235,436 @@ def test_load_db_config_raises_for_unknown_template(tmp_path):
     )
 
     with pytest.raises(ValueError, match="Шаблон missing_template для БД broken_db не найден"):
-        DatabaseManager(config_path=str(config_path))
\ No newline at end of file
+        DatabaseManager(config_path=str(config_path))
+
+def test_load_db_config_cache_picks_up_file_changes(tmp_path):
+    config_path = tmp_path / "db.yaml"
+    config_path.write_text("first_db:\n  first-host.skyeng.link: 5432\n  first_user: secret\n", encoding="utf-8")
+    first = DatabaseManager(config_path=str(config_path))
+    first.connections["first_db"]["host"] = "mutated"
+
+    # Повторное создание не должно видеть мутации предыдущего экземпляра
+    again = DatabaseManager(config_path=str(config_path))
+    assert again.connections["first_db"]["host"] == "first-host.skyeng.link"
+
+    config_path.write_text("second_db:\n  second-host.skyeng.link: 6432\n  second_user: secret\n", encoding="utf-8")
+    changed = DatabaseManager(config_path=str(config_path))
+    assert list(changed.connections) == ["second_db"]
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        self.connection.executed.append((query, params))
+
+    def fetchone(self):
+        return self.connection.rows.pop(0)
+
+    def fetchall(self):
+        return self.connection.rows.pop(0)
+
+    def fetchmany(self, size):
+        chunk = self.connection.rows[:size]
+        del self.connection.rows[:size]
+        return chunk
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.executed = []
+        self.rows = []
+        self.autocommit = False
+        self.autocommit_history = []
+
+    def __setattr__(self, name, value):
+        if name == "autocommit" and "autocommit_history" in self.__dict__:
+            self.autocommit_history.append(value)
+        super().__setattr__(name, value)
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.kwargs = kwargs
+        self.conn = FakeConnection()
+        self.returned = []
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+    def closeall(self):
+        pass
+
+
+POOLED_DB_CONFIG = """
+pooled_db:
+  pooled-host.skyeng.link: 5432
+  pooled_user: secret
+"""
+
+
+@pytest.fixture
+def pooled_manager(tmp_path, monkeypatch):
+    """Фабрика DatabaseManager с подмененным пулом подключений; созданные пулы - в pooled_manager.pools"""
+    pools = []
+
+    def create_pool(minconn, maxconn, **kwargs):
+        pool = FakePool(minconn, maxconn, **kwargs)
+        pools.append(pool)
+        return pool
+
+    monkeypatch.setattr(mcp_db_server.psycopg2.pool, "ThreadedConnectionPool", create_pool)
+
+    def factory(config_text=POOLED_DB_CONFIG):
+        return create_db_manager_with_config(tmp_path, config_text)
+
+    factory.pools = pools
+    return factory
+
+
+def test_get_connection_reuses_pool_per_database(pooled_manager):
+    manager = pooled_manager()
+
+    with manager._get_connection("pooled_db") as conn:
+        pass
+    with pytest.raises(RuntimeError):
+        with manager._get_connection("pooled_db") as conn:
+            raise RuntimeError("boom")
+
+    assert len(pooled_manager.pools) == 1
+    pool = pooled_manager.pools[0]
+    assert pool.kwargs["host"] == "pooled-host.skyeng.link"
+    assert conn.commits == 1
+    assert conn.rollbacks == 1
+    assert pool.returned == [(conn, False), (conn, False)]
+
+    with pytest.raises(ValueError, match="БД missing_db не найдена в конфигурации"):
+        with manager._get_connection("missing_db"):
+            pass
+
+
+def test_get_pool_connects_outside_shared_lock(pooled_manager, monkeypatch):
+    manager = pooled_manager()
+    create_pool = mcp_db_server.psycopg2.pool.ThreadedConnectionPool
+    shared_lock_held = []
+
+    def create_pool_checking_lock(minconn, maxconn, **kwargs):
+        shared_lock_held.append(manager._pools_lock.locked())
+        return create_pool(minconn, maxconn, **kwargs)
+
+    monkeypatch.setattr(mcp_db_server.psycopg2.pool, "ThreadedConnectionPool", create_pool_checking_lock)
+
+    manager._get_pool("pooled_db")
+    manager._get_pool("pooled_db")
+
+    assert shared_lock_held == [False]
+
+
+class DroppingConnection(FakeConnection):
+    def cursor(self, *args, **kwargs):
+        raise mcp_db_server.psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+def test_get_connection_replaces_dropped_idle_connection(pooled_manager):
+    manager = pooled_manager()
+    manager.pool_ping_after = 0
+    with manager._get_connection("pooled_db"):
+        pass
+
+    pool = pooled_manager.pools[0]
+    dropped = pool.conn = DroppingConnection()
+    manager._conn_released_at[id(dropped)] = 0.0
+    fresh = FakeConnection()
+    connections = iter([dropped, fresh])
+    pool.getconn = lambda: next(connections)
+
+    with manager._get_connection("pooled_db") as conn:
+        assert conn is fresh
+
+    assert pool.returned[-2:] == [(dropped, True), (fresh, False)]
+
+
+@pytest.mark.parametrize("database_name", ["pooled_db", "crm_auto_y10"])
+def test_execute_query_discards_session_state_before_returning_connection(pooled_manager, database_name):
+    manager = pooled_manager(
+        """
+        pooled_db:
+          pooled-host.skyeng.link: 5432
+          pooled_user: secret
+        crm_auto_y10:
+          test-host.skyeng.link: 5432
+          test_user: secret
+        """
+    )
+    conn = manager._get_pool(database_name).conn
+    conn.rows.append({"tables": None})
+
+    manager.get_tables_schemas_direct(database_name)
+    assert ("DISCARD ALL", None) not in conn.executed
+
+    result = manager.execute_query_direct(
+        "SELECT set_config('statement_timeout', '1', false)", database_name
+    )
+
+    assert result["success"] is True
+    assert conn.executed[-1] == ("DISCARD ALL", None)
+    assert conn.autocommit is False
+
+
+def test_released_at_is_not_kept_for_connections_closed_by_pool(pooled_manager):
+    manager = pooled_manager()
+    pool = manager._get_pool("pooled_db")
+
+    with manager._get_connection("pooled_db") as conn:
+        pass
+    assert id(conn) in manager._conn_released_at
+
+    pool.conn = FakeConnection()
+    pool.putconn = lambda conn, close=False: setattr(conn, "closed", 1)
+    with manager._get_connection("pooled_db") as conn:
+        pass
+
+    assert id(conn) not in manager._conn_released_at
+
+
+def test_list_databases_uses_single_query_per_database(pooled_manager):
+    manager = pooled_manager(
+        """
+        second_db:
+          second-host.skyeng.link: 5432
+          second_user: secret
+        first_db:
+          first-host.skyeng.link: 5432
+          first_user: secret
+          block_store: first_block_store
+        """
+    )
+    for db_name in manager.connections:
+        pool = manager._get_pool(db_name)
+        pool.conn.rows.append({"database_name": db_name, "tables_count": 3})
+
+    databases = manager.list_databases()
+
+    assert list(databases) == ["second_db", "first_db"]
+    assert databases["first_db"]["available"] is True
+    assert databases["first_db"]["tables_count"] == 3
+    assert databases["first_db"]["block_store_database"] == "first_block_store"
+    assert all(len(pool.conn.executed) == 1 for pool in pooled_manager.pools)
+
+
+def test_list_databases_caches_result_within_ttl(pooled_manager):
+    manager = pooled_manager()
+    pool = manager._get_pool("pooled_db")
+    pool.conn.rows.extend([{"tables_count": 1}, {"tables_count": 2}])
+
+    first = manager.list_databases()
+    first["pooled_db"]["tables_count"] = 100
+    assert manager.list_databases()["pooled_db"]["tables_count"] == 1
+    assert len(pool.conn.executed) == 1
+
+    manager.list_databases_ttl = 0
+    assert manager.list_databases()["pooled_db"]["tables_count"] == 2
+    assert len(pool.conn.executed) == 2
+
+
+def test_get_tables_schemas_serves_repeated_tables_from_cache(pooled_manager, monkeypatch):
+    monkeypatch.setattr(mcp_db_server, "_SCHEMA_CACHE_MAX", 1)
+    manager = pooled_manager()
+    conn = manager._get_pool("pooled_db").conn
+    conn.rows.append({"tables": {
+        "users": {
+            "columns": [{"column_name": "id", "data_type": "integer", "is_nullable": "NO"}],
+            "indexes": [{"indexname": "users_pkey", "indexdef": "CREATE UNIQUE INDEX users_pkey"}],
+        },
+    }})
+
+    first = manager.get_tables_schemas_direct("pooled_db", ["users"])
+    assert len(conn.executed) == 1
+    assert conn.executed[0][1] == {"table_names": ["users"]}
+    second = manager.get_tables_schemas_direct("pooled_db", ["users"])
+
+    assert second["tables"] == first["tables"]
+    assert second["tables"]["users"]["indexes"][0]["indexname"] == "users_pkey"
+    assert len(conn.executed) == 1
+
+    manager._schema_cache_put("pooled_db:rooms", {"columns": [], "indexes": []})
+    assert list(manager.schema_cache) == ["pooled_db:rooms"]
+
+
+def test_warm_up_opens_connection_without_raising(pooled_manager):
+    manager = pooled_manager()
+
+    manager.warm_up("pooled_db")
+    manager.warm_up("missing_db")
+
+    assert pooled_manager.pools[0].conn.executed == [("SELECT 1", None)]
+
+
+def test_warm_up_reports_failed_schema_prewarm(pooled_manager, caplog):
+    manager = pooled_manager()
+    conn = manager._get_pool("pooled_db").conn
+    conn.rows.append((3,))
+
+    with caplog.at_level("INFO", logger=mcp_db_server.logger.name):
+        manager.warm_up("pooled_db", with_schemas=True)
+
+    assert "Не удалось прогреть кэш схем БД pooled_db" in caplog.text
+    assert "прогрето" not in caplog.text
+
+
+def test_warm_up_skips_schemas_larger_than_cache(pooled_manager):
+    manager = pooled_manager()
+    conn = manager._get_pool("pooled_db").conn
+    conn.rows.append((mcp_db_server._SCHEMA_CACHE_MAX + 1,))
+
+    manager.warm_up("pooled_db", with_schemas=True)
+
+    assert len(conn.executed) == 1
+    assert "pg_class" in conn.executed[0][0]
+    assert len(manager.schema_cache) == 0
+
+
+def test_get_database_info_returns_rows_without_copying(pooled_manager):
+    manager = pooled_manager()
+    row = mcp_db_server.psycopg2.extras.RealDictRow()
+    row["database_name"] = "pooled_db"
+    row["tables"] = [{"tablename": "users", "size": "8192 bytes"}]
+    manager._get_pool("pooled_db").conn.rows.append(row)
+
+    result = manager.get_database_info_direct("pooled_db")
+
+    assert result["info"] is row
+    assert result["info"] == {"database_name": "pooled_db"}
+    assert result["tables"] == [{"tablename": "users", "size": "8192 bytes"}]
+    assert result["tables_count"] == 1
+
+
+def test_list_tools_returns_prebuilt_tools():
+    tools = asyncio.run(mcp_db_server.list_tools())
+
+    assert asyncio.run(mcp_db_server.list_tools()) is tools
+    assert [tool.name for tool in tools] == [
+        "execute_query", "get_tables_schemas", "list_databases", "get_database_info"
+    ]
+
+
+def test_dumps_matches_stdlib_json_output():
+    payload = {
+        "success": True,
+        "data": [{
+            "name": "Тест",
+            "created_at": datetime.datetime(2024, 1, 2, 3, 4, 5),
+            "day": datetime.date(2024, 1, 2),
+            "price": decimal.Decimal("1.50"),
+            "uid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        }],
+        "rows_count": 1,
+    }
+
+    assert json.loads(mcp_db_server._dumps(payload)) == json.loads(
+        json.dumps(payload, ensure_ascii=False, indent=2, default=str)
+    )
+
+
+def test_dumps_falls_back_to_stdlib_json_for_big_integers():
+    payload = {"success": True, "data": [{"value": 2**70}], "rows_count": 1}
+
+    assert json.loads(mcp_db_server._dumps(payload)) == payload
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_is_compact_without_pretty_flag(monkeypatch, use_orjson):
+    monkeypatch.setattr(mcp_db_server, "_INDENT", None)
+    if use_orjson:
+        orjson = mcp_db_server.orjson
+        monkeypatch.setattr(mcp_db_server, "_ORJSON_OPTIONS", mcp_db_server._ORJSON_OPTIONS & ~orjson.OPT_INDENT_2)
+    else:
+        monkeypatch.setattr(mcp_db_server, "orjson", None)
+
+    assert mcp_db_server._dumps({"success": True, "data": [{"name": "Тест"}]}) == (
+        '{"success":true,"data":[{"name":"Тест"}]}'
+    )
+
+
+def test_call_tool_runs_database_work_off_event_loop_thread(monkeypatch):
+    calls = []
+
+    def fake_execute_query_direct(query, database, max_rows=None):
+        calls.append(threading.current_thread() is threading.main_thread())
+        return {"success": True, "data": [], "rows_count": 0, "database": database}
+
+    monkeypatch.setattr(mcp_db_server.db_manager, "execute_query_direct", fake_execute_query_direct)
+
+    result = asyncio.run(mcp_db_server.call_tool("execute_query", {"query": "SELECT 1", "database": "db_name"}))
+
+    assert calls == [False]
+    assert json.loads(result[0].text)["success"] is True
+
+
+@pytest.mark.parametrize(
+    ("max_rows", "expected_rows", "truncated"),
+    [
+        (None, 5, False),
+        (5, 5, False),
+        (3, 3, True),
+        (0, 0, True),
+    ],
+)
+def test_execute_query_fetches_in_chunks_and_reports_truncation(
+    pooled_manager, max_rows, expected_rows, truncated
+):
+    manager = pooled_manager()
+    manager._get_pool("pooled_db").conn.rows.extend({"id": i} for i in range(5))
+
+    result = manager.execute_query_direct("SELECT id FROM users", "pooled_db", max_rows=max_rows, chunk_size=2)
+
+    assert result["success"] is True
+    assert result["data"] == [{"id": i} for i in range(expected_rows)]
+    assert result["rows_count"] == expected_rows
+    assert result.get("truncated", False) is truncated
+    assert result.get("limit") == (max_rows if truncated else None)
+
+
+@pytest.mark.parametrize("max_rows", [-1, "3", 2.5, True])
+def test_execute_query_rejects_invalid_max_rows(pooled_manager, max_rows):
+    manager = pooled_manager()
+
+    with pytest.raises(ValueError, match="max_rows должен быть неотрицательным целым числом"):
+        manager.execute_query_direct("SELECT id FROM users", "pooled_db", max_rows=max_rows)
+
+    assert pooled_manager.pools == []
+
+
+def test_metadata_queries_use_autocommit_without_commit(pooled_manager):
+    manager = pooled_manager()
+    conn = manager._get_pool("pooled_db").conn
+    conn.rows.append({"tables": None})
+
+    result = manager.get_tables_schemas_direct("pooled_db")
+
+    assert result["success"] is True
+    assert conn.commits == 0
+    assert conn.autocommit_history == [True, False]
+    assert conn.autocommit is False